@@ -1,35 +1,122 @@
 import pandas as pd
 import numpy as np
 import dash
-from dash import dcc, html
+from dash import dcc, html, DiskcacheManager
 from dash.dependencies import Input, Output, State
 import plotly.express as px
+import plotly.io as pio
+import plotly.graph_objects as go
+import os
 import sqlite3
+import diskcache
 import warnings
+import copy
+import json
 from prophet import Prophet
 
 # Suppress Warnings
 warnings.simplefilter(action="ignore", category=FutureWarning)
 
 file_path = "AdidasUSSalesDatasets.xlsx"
-xls = pd.ExcelFile(file_path)
-df = pd.read_excel(xls, sheet_name="Data Sales Adidas")
+# Cleaned copy of the sheet; parsing the workbook is the slowest part of start-up.
+# Bump the version whenever the cleaning below changes so stale caches are rebuilt.
+SALES_CACHE_VERSION = 1
+parquet_path = f"AdidasUSSalesDatasets.v{SALES_CACHE_VERSION}.parquet"
 
+if os.path.exists(parquet_path) and os.path.getmtime(parquet_path) > os.path.getmtime(file_path):
+    df = pd.read_parquet(parquet_path, engine="pyarrow")
+else:
+    xls = pd.ExcelFile(file_path)
+    df = pd.read_excel(xls, sheet_name="Data Sales Adidas")
 
-df = df.iloc[3:].reset_index(drop=True)
-df.columns = ["Index", "Retailer", "Retailer ID", "Invoice Date", "Region", "State", "City",
-              "Product", "Price per Unit", "Units Sold", "Total Sales", "Operating Profit",
-              "Operating Margin", "Sales Method"]
-df = df.iloc[1:].reset_index(drop=True)
-df["Invoice Date"] = pd.to_datetime(df["Invoice Date"], errors="coerce")
-df.drop(columns=["Index"], inplace=True)
+    df = df.iloc[3:].reset_index(drop=True)
+    df.columns = ["Index", "Retailer", "Retailer ID", "Invoice Date", "Region", "State", "City",
+                  "Product", "Price per Unit", "Units Sold", "Total Sales", "Operating Profit",
+                  "Operating Margin", "Sales Method"]
+    df = df.iloc[1:].reset_index(drop=True)
+    df["Invoice Date"] = pd.to_datetime(df["Invoice Date"], errors="coerce")
+    df.drop(columns=["Index"], inplace=True)
+
+    # Narrow numeric columns (Excel yields object dtype) to halve the bytes each reduction reads
+    df["Units Sold"] = pd.to_numeric(df["Units Sold"], errors="coerce", downcast="unsigned")
+    for col in ("Price per Unit", "Total Sales", "Operating Profit", "Operating Margin"):
+        df[col] = pd.to_numeric(df[col], errors="coerce").astype("float32")
+
+    # Low-cardinality text columns as categoricals: filters and groupbys work on integer codes
+    for col in ("Retailer", "Region", "State", "City", "Product", "Sales Method"):
+        df[col] = df[col].astype("category")
+
+    # Keep rows ordered by date so range filters can binary-search instead of masking
+    df = df.dropna(subset=["Invoice Date"]).sort_values("Invoice Date").reset_index(drop=True)
+    # Days since epoch, used to bin daily totals with np.bincount
+    df["Day Code"] = df["Invoice Date"].values.astype("datetime64[D]").astype(np.int64)
+
+    # Write to a per-process temporary file first so concurrent workers never read or
+    # write a partial parquet
+    tmp_path = f"{parquet_path}.{os.getpid()}.tmp"
+    try:
+        df.to_parquet(tmp_path, engine="pyarrow", compression="zstd")
+        os.replace(tmp_path, parquet_path)
+    except OSError:
+        pass
+
+# Sorted DatetimeIndex, carried into the sales summary so date ranges are .loc[start:end] slices
+df = df.set_index("Invoice Date")
+
+# Daily totals per region/product pair, about a third of the raw rows. Callbacks filter and
+# reduce this summary instead of the raw sales. Sums use 64-bit types so totals stay exact.
+# Rows missing a region or product are kept so the unfiltered totals match the raw data, and
+# Row Count only counts priced rows so Price Total / Row Count is the mean unit price.
+sales_summary = (
+    df.astype({"Units Sold": np.float64, "Total Sales": np.float64, "Price per Unit": np.float64})
+    .groupby(["Invoice Date", "Region", "Product"], observed=True, dropna=False)
+    .agg(**{"Units Sold": ("Units Sold", "sum"),
+            "Total Sales": ("Total Sales", "sum"),
+            "Price Total": ("Price per Unit", "sum"),
+            "Row Count": ("Price per Unit", "count"),
+            "Day Code": ("Day Code", "first")})
+    .reset_index(level=["Region", "Product"])
+)
+
+# Dropdown options come straight from the category levels
+REGION_OPTIONS = [{"label": region, "value": region} for region in df["Region"].cat.categories]
+PRODUCT_OPTIONS = [{"label": product, "value": product} for product in df["Product"].cat.categories]
+
+# Forecast on weekly totals once the selected history spans two years: Prophet's own threshold
+# for yearly seasonality, which then stands in for the weekly pattern weekly totals cannot show
+WEEKLY_FORECAST_MIN_DAYS = 730
+
+# Built once so the Stan backend is loaded at start-up rather than in the first callback.
+# A Prophet instance can only be fit once, so each forecast fits a deep copy.
+# 100 posterior draws (default 1000) are enough for the plotted bounds and dominate predict time.
+prophet_template = Prophet(uncertainty_samples=100, daily_seasonality=False)
+
+# Part of the forecast cache key: the key covers only update_forecast's own source, so bump
+# this whenever build_forecast_figure, the Prophet settings or the weekly threshold change
+FORECAST_CACHE_VERSION = 4
+
+# Shared on-disk cache: background callback jobs and results live here, and every worker
+# process (including the forked background jobs) sees the same entries
+forecast_cache = diskcache.Cache("./cache")
+
+# Background callbacks run in forked worker processes. Dash starts a job for every request,
+# even when a result for the same inputs is already stored, and picks it up at the next poll.
+background_callback_manager = DiskcacheManager(
+    forecast_cache,
+    cache_by=[lambda: os.path.getmtime(file_path), lambda: FORECAST_CACHE_VERSION],
+    expire=3600
+)
 
 # Initialize Dash App
-app = dash.Dash(__name__, external_stylesheets=["https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/css/bootstrap.min.css"])
+app = dash.Dash(__name__, external_stylesheets=["https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/css/bootstrap.min.css"],
+                background_callback_manager=background_callback_manager)
 
 # SQLite Database Setup
 conn = sqlite3.connect("sales_history.db", check_same_thread=False)
 cursor = conn.cursor()
+# WAL lets dashboard users read saved views while another worker is writing
+cursor.execute("PRAGMA journal_mode=WAL")
+cursor.execute("PRAGMA synchronous=NORMAL")
 cursor.execute("""
     CREATE TABLE IF NOT EXISTS past_views (
         id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -41,6 +128,9 @@ cursor.execute("""
 """)
 conn.commit()
 
+# Most recent saved views shown by "View Past Data"
+PAST_VIEWS_LIMIT = 50
+
 app.layout = html.Div(className="container mt-4", children=[
     html.H1("OPTIVENT: A Forecaster By C V Kewin Wilkins", className="text-center mb-4 text-primary"),
 
@@ -50,8 +140,8 @@ app.layout = html.Div(className="container mt-4", children=[
             html.Label("Select Date Range", className="fw-bold"),
             dcc.DatePickerRange(
                 id="date-picker",
-                start_date=df["Invoice Date"].min(),
-                end_date=df["Invoice Date"].max(),
+                start_date=df.index.min(),
+                end_date=df.index.max(),
                 display_format="YYYY-MM-DD",
                 className="form-control"
             )
@@ -60,7 +150,7 @@ app.layout = html.Div(className="container mt-4", children=[
             html.Label("Select Region", className="fw-bold"),
             dcc.Dropdown(
                 id="region-dropdown",
-                options=[{"label": i, "value": i} for i in df["Region"].unique()],
+                options=REGION_OPTIONS,
                 placeholder="All Regions",
                 multi=True,
                 className="form-select"
@@ -70,7 +160,7 @@ app.layout = html.Div(className="container mt-4", children=[
             html.Label("Select Product", className="fw-bold"),
             dcc.Dropdown(
                 id="product-dropdown",
-                options=[{"label": i, "value": i} for i in df["Product"].unique()],
+                options=PRODUCT_OPTIONS,
                 placeholder="All Products",
                 multi=True,
                 className="form-select"
@@ -118,11 +208,104 @@ app.layout = html.Div(className="container mt-4", children=[
     html.Div(id="past-data-output", className="mt-4")
 ])
 
+def category_mask(column, selected):
+    # Lookup table indexed by category code; the trailing False catches missing values (code -1)
+    allowed = np.append(column.cat.categories.isin(selected), False)
+    return allowed[column.cat.codes.to_numpy()]
+
+def filter_sales(start_date, end_date, selected_regions, selected_products):
+    filtered_df = sales_summary.loc[start_date:end_date]
+
+    # Region and product membership combined into one mask, applied in a single selection
+    if selected_regions or selected_products:
+        keep = np.ones(len(filtered_df), dtype=bool)
+        if selected_regions:
+            keep &= category_mask(filtered_df["Region"], selected_regions)
+        if selected_products:
+            keep &= category_mask(filtered_df["Product"], selected_products)
+        filtered_df = filtered_df[keep]
+
+    return filtered_df
+
+def daily_units(filtered_df):
+    codes = filtered_df["Day Code"].to_numpy()
+    if codes.size == 0:
+        return pd.DataFrame({"Invoice Date": pd.to_datetime([]), "Units Sold": []})
+
+    first_day = codes.min()
+    offsets = codes - first_day
+    totals = np.bincount(offsets, weights=filtered_df["Units Sold"].to_numpy(dtype=np.float64))
+    has_sales = np.bincount(offsets) > 0
+    days = np.arange(first_day, first_day + totals.size).astype("datetime64[D]")
+    return pd.DataFrame({"Invoice Date": days[has_sales], "Units Sold": totals[has_sales]})
+
+def no_data_figure():
+    fig = go.Figure()
+    fig.update_layout(title="No Data")
+    return fig
+
+def figure_json(fig):
+    # Plain dict form of a figure: cheap to keep in a cache and passed to dcc.Graph as-is
+    return json.loads(pio.to_json(fig))
+
+# Prophet fitting dominates forecast time, so finished figures are memoized on the shared disk
+# cache per filter selection; forked background jobs return at once on a repeat. The name ties
+# entries to the forecast version and the workbook, and arguments must be hashable:
+# regions/products are passed as sorted tuples.
+@forecast_cache.memoize(
+    name=f"build_forecast_figure:v{FORECAST_CACHE_VERSION}:{os.path.getmtime(file_path)}",
+    expire=3600
+)
+def build_forecast_figure(start_date, end_date, selected_regions, selected_products):
+    forecast_data = daily_units(filter_sales(start_date, end_date, selected_regions, selected_products))
+    if forecast_data.empty:
+        return figure_json(no_data_figure())
+
+    forecast_fig = px.line(title="Sales Forecast")
+    forecast_data = forecast_data.rename(columns={"Invoice Date": "ds", "Units Sold": "y"})
+
+    if len(forecast_data) >= 2:
+        # Long histories are fit on weekly totals: ~7x fewer rows for Prophet to optimize.
+        # Weeks are 7-day blocks counted from the first sale day and labelled by their last
+        # day; a trailing partial week would understate sales, so it is dropped.
+        title, periods, freq = "Sales Forecast", 90, "D"
+        first_day = forecast_data["ds"].iloc[0]
+        span_days = (forecast_data["ds"].iloc[-1] - first_day).days + 1
+        if span_days >= WEEKLY_FORECAST_MIN_DAYS:
+            week = (forecast_data["ds"] - first_day).dt.days // 7
+            weekly_units = forecast_data["y"].groupby(week).sum().reindex(range(span_days // 7), fill_value=0)
+            forecast_data = pd.DataFrame({
+                "ds": first_day + pd.to_timedelta(weekly_units.index * 7 + 6, unit="D"),
+                "y": weekly_units.to_numpy()
+            })
+            title, periods, freq = "Weekly Sales Forecast", 13, "7D"
+
+        model = copy.deepcopy(prophet_template)
+        if freq == "7D":
+            # Weekly totals have no within-week pattern to fit. Yearly seasonality follows the
+            # daily span: trimming to whole weeks can leave the weekly series just under the
+            # two years Prophet's "auto" setting requires.
+            model.weekly_seasonality = False
+            model.yearly_seasonality = True
+        model.fit(forecast_data)
+        future_dates = model.make_future_dataframe(periods=periods, freq=freq)
+        forecast = model.predict(future_dates)
+
+        forecast.rename(columns={"yhat": "Prediction"}, inplace=True)
+        forecast_fig = px.line(forecast, x="ds", y="Prediction", title=title)
+        forecast_fig.add_scatter(x=forecast["ds"], y=forecast["yhat_lower"], mode="lines", name="Lower Bound")
+        forecast_fig.add_scatter(x=forecast["ds"], y=forecast["yhat_upper"], mode="lines", name="Upper Bound")
+
+    return figure_json(forecast_fig)
+
+def empty_dashboard():
+    fig = no_data_figure()
+    return fig, fig, "Total Sales: $0", "Units Sold: 0", "Avg Price: $0"
+
 # Callback for Dashboard Update
 @app.callback(
     [Output("sales-trend", "figure"),
      Output("sales-pie-chart", "figure"),
-     Output("forecast-graph", "figure"),
      Output("total-sales", "children"),
      Output("total-units", "children"),
      Output("avg-price", "children")],
@@ -132,42 +315,42 @@ app.layout = html.Div(className="container mt-4", children=[
      Input("product-dropdown", "value")]
 )
 def update_dashboard(start_date, end_date, selected_regions, selected_products):
-    filtered_df = df[(df["Invoice Date"] >= start_date) & (df["Invoice Date"] <= end_date)]
-
-    if selected_regions:
-        filtered_df = filtered_df[filtered_df["Region"].isin(selected_regions)]
-    if selected_products:
-        filtered_df = filtered_df[filtered_df["Product"].isin(selected_products)]
+    filtered_df = filter_sales(start_date, end_date, selected_regions, selected_products)
+    if filtered_df.empty:
+        return empty_dashboard()
 
     # Sales Trend
-    sales_agg = filtered_df.groupby("Invoice Date")["Units Sold"].sum().reset_index()
+    sales_agg = daily_units(filtered_df)
     sales_trend_fig = px.line(sales_agg, x="Invoice Date", y="Units Sold", title="Sales Trend Over Time")
 
     # Pie Chart
-    sales_pie_fig = px.pie(filtered_df, names="Product", values="Total Sales", title="Sales Breakdown by Product")
-
-    # Forecasting
-    forecast_fig = px.line(title="Sales Forecast")
-    forecast_data = filtered_df.groupby("Invoice Date")["Units Sold"].sum().reset_index()
-    forecast_data = forecast_data.rename(columns={"Invoice Date": "ds", "Units Sold": "y"})
-
-    if len(forecast_data) >= 2:
-        model = Prophet()
-        model.fit(forecast_data)
-        future_dates = model.make_future_dataframe(periods=90)
-        forecast = model.predict(future_dates)
-
-        forecast.rename(columns={"yhat": "Prediction"}, inplace=True)
-        forecast_fig = px.line(forecast, x="ds", y="Prediction", title="Sales Forecast")
-        forecast_fig.add_scatter(x=forecast["ds"], y=forecast["yhat_lower"], mode="lines", name="Lower Bound")
-        forecast_fig.add_scatter(x=forecast["ds"], y=forecast["yhat_upper"], mode="lines", name="Upper Bound")
+    # One row per product instead of every sale
+    pie_agg = filtered_df.groupby("Product", observed=True, sort=False)["Total Sales"].sum().reset_index()
+    sales_pie_fig = px.pie(pie_agg, names="Product", values="Total Sales", title="Sales Breakdown by Product")
 
     # KPIs
-    total_sales = f"Total Sales: ${filtered_df['Total Sales'].sum():,.0f}"
-    total_units = f"Units Sold: {filtered_df['Units Sold'].sum():,.0f}"
-    avg_price = f"Avg Price: ${filtered_df['Price per Unit'].mean():.2f}"
+    kpi = filtered_df[["Total Sales", "Units Sold", "Price Total", "Row Count"]].sum()
+    total_sales = f"Total Sales: ${kpi['Total Sales']:,.0f}"
+    total_units = f"Units Sold: {kpi['Units Sold']:,.0f}"
+    avg_price = f"Avg Price: ${kpi['Price Total'] / kpi['Row Count']:.2f}"
+
+    return sales_trend_fig, sales_pie_fig, total_sales, total_units, avg_price
 
-    return sales_trend_fig, sales_pie_fig, forecast_fig, total_sales, total_units, avg_price
+# Callback for Forecast Update, run in the background so Prophet fitting does not hold up the
+# other charts. Polled every 250 ms rather than Dash's default second, since fits are short.
+@app.callback(
+    Output("forecast-graph", "figure"),
+    [Input("date-picker", "start_date"),
+     Input("date-picker", "end_date"),
+     Input("region-dropdown", "value"),
+     Input("product-dropdown", "value")],
+    background=True,
+    interval=250
+)
+def update_forecast(start_date, end_date, selected_regions, selected_products):
+    return build_forecast_figure(start_date, end_date,
+                                 tuple(sorted(selected_regions or [])),
+                                 tuple(sorted(selected_products or [])))
 
 # Callback for Saving, Viewing & Deleting Past Data
 @app.callback(
@@ -189,15 +372,21 @@ def handle_past_data(save_click, view_click, delete_click, start_date, end_date,
 
     if button_id == "save-view-btn":
         cursor.execute("INSERT INTO past_views (start_date, end_date, selected_regions, selected_products) VALUES (?, ?, ?, ?)",
-                       (start_date, end_date, str(regions), str(products)))
+                       (start_date, end_date, json.dumps(regions or []), json.dumps(products or [])))
         conn.commit()
 
     elif button_id == "delete-all-btn":
         cursor.execute("DELETE FROM past_views")
         conn.commit()
 
-    past_data = pd.read_sql("SELECT * FROM past_views", conn)
-    return html.Pre(past_data.to_string())
+    # Newest saved views first, capped so the listing does not grow with the table
+    rows = cursor.execute(
+        "SELECT id, start_date, end_date, selected_regions, selected_products FROM past_views "
+        "ORDER BY id DESC LIMIT ?", (PAST_VIEWS_LIMIT,)
+    ).fetchall()
+    header = html.Tr([html.Th(col) for col in ("ID", "Start Date", "End Date", "Regions", "Products")])
+    return html.Table([header] + [html.Tr([html.Td(str(value)) for value in row]) for row in rows],
+                      className="table table-sm")
 
 server = app.server
 if __name__ == "__main__":